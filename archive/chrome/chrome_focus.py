@@ -2,17 +2,17 @@
 import os
 import sys
 import json
+import functools
+import random
+import secrets
 import time
 import signal
-import hashlib
+import shutil
 import subprocess
-import select
+import tempfile
 from pathlib import Path
 from typing import List, Dict, Optional
 import click
-import yaml
-import requests
-import psutil
 
 # Terminal control for anti-paste
 try:
@@ -22,19 +22,33 @@ try:
 except ImportError:
     HAS_TERMIOS = False
 
+# Common system process prefixes/suffixes for obfuscated daemon names
+DAEMON_NAME_PREFIXES = (
+    "systemd", "gvfs", "dbus", "update-notifier",
+    "evolution", "tracker", "gnome", "gio"
+)
+DAEMON_NAME_SUFFIXES = (
+    "monitor", "helper", "daemon", "service",
+    "worker", "store", "miner", "agent"
+)
+
+
+# Cross-platform Chrome policy paths (resolved once at import)
+if sys.platform == "darwin":  # macOS
+    _POLICY_DIR = Path("/Library/Google/Chrome/NativeMessagingHosts/policies/managed")
+else:  # Linux
+    _POLICY_DIR = Path("/etc/opt/chrome/policies/managed")
+_POLICY_FILE = _POLICY_DIR / "managed_policies.json"
+
 
-# Cross-platform Chrome policy paths
 def get_chrome_policy_path() -> Path:
     """Get Chrome managed policy path for current OS"""
-    if sys.platform == "darwin":  # macOS
-        return Path("/Library/Google/Chrome/NativeMess agingHosts/policies/managed")
-    else:  # Linux
-        return Path("/etc/opt/chrome/policies/managed")
+    return _POLICY_DIR
 
 
 def get_policy_file_path() -> Path:
     """Get full path to policy JSON file"""
-    return get_chrome_policy_path() / "managed_policies.json"
+    return _POLICY_FILE
 
 
 def get_daemon_lock_file() -> Path:
@@ -42,40 +56,61 @@ def get_daemon_lock_file() -> Path:
     return Path("/tmp/.chrome_focus_daemon.lock")
 
 
-def get_obfuscated_daemon_name() -> str:
-    """Generate random obfuscated daemon name that looks like a system process"""
-    import random
-    import string
+def get_reenable_lock_file() -> Path:
+    """Get pending re-enable record path (hidden, next to daemon lock)"""
+    return Path("/tmp/.chrome_focus_reenable.lock")
 
-    # Common system process prefixes
-    prefixes = [
-        "systemd", "gvfs", "dbus", "update-notifier",
-        "evolution", "tracker", "gnome", "gio"
-    ]
-
-    # Common system process suffixes
-    suffixes = [
-        "monitor", "helper", "daemon", "service",
-        "worker", "store", "miner", "agent"
-    ]
 
-    # Generate random ID (letters only, looks more system-like)
-    random_id = ''.join(random.choices(string.ascii_lowercase, k=6))
+def pid_alive(pid: int) -> bool:
+    """Check whether a process exists with a single kill(pid, 0) syscall"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists but owned by another user
+    return True
 
-    prefix = random.choice(prefixes)
-    suffix = random.choice(suffixes)
 
-    return f"{prefix}-{random_id}-{suffix}"
+def get_obfuscated_daemon_name() -> str:
+    """Generate random obfuscated daemon name that looks like a system process"""
+    # Random hex ID, e.g. "dbus-3fa9c1-store"
+    return f"{random.choice(DAEMON_NAME_PREFIXES)}-{secrets.token_hex(3)}-{random.choice(DAEMON_NAME_SUFFIXES)}"
 
 
+@functools.lru_cache(maxsize=1)
 def load_plugins() -> List[Dict]:
-    """Load plugins from YAML file"""
+    """Load plugins from YAML file (parsed once per process)"""
+    import yaml
+
     yaml_path = Path(__file__).parent / "plugins.yml"
+    # Prefer the LibYAML C parser when PyYAML was built with it
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(yaml_path, 'r') as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=loader)
         return data.get('plugins', [])
 
 
+def _write_atomic(path: Path, blob: bytes) -> None:
+    """Write bytes to a temp file next to path and rename it into place, so
+    the swap is a single atomic rename on the same filesystem"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".sync.")
+    try:
+        try:
+            view = memoryview(blob)
+            while view:
+                view = view[os.write(fd, view):]  # Retry short writes
+            os.fchmod(fd, 0o644)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
 def create_chrome_policy() -> None:
     """Create Chrome managed policy JSON file"""
     plugins = load_plugins()
@@ -88,8 +123,9 @@ def create_chrome_policy() -> None:
     policy_path = get_policy_file_path()
     policy_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(policy_path, 'w') as f:
-        json.dump(policy, f, indent=2)
+    # Chrome ignores whitespace, so serialize compact bytes up front
+    blob = json.dumps(policy, separators=(",", ":")).encode()
+    _write_atomic(policy_path, blob)
 
     print(f"✓ Chrome policy created at {policy_path}")
 
@@ -104,6 +140,8 @@ def remove_chrome_policy() -> None:
 
 def get_motivational_quote() -> str:
     """Fetch motivational quote from API"""
+    import requests
+
     try:
         response = requests.get("https://api.quotable.io/random?tags=inspirational", timeout=5)
         if response.status_code == 200:
@@ -119,13 +157,12 @@ def get_motivational_quote() -> str:
         "Believe you can and you're halfway there. - Theodore Roosevelt",
         "Your limitation—it's only your imagination. - Unknown"
     ]
-    import random
     return random.choice(fallbacks)
 
 
 def read_quote_no_paste(expected_quote: str) -> bool:
     """
-    Read user input character-by-character to prevent copy/paste.
+    Read user input keystroke-by-keystroke to prevent copy/paste.
     Returns True if quote matches exactly, False otherwise.
     """
     if not HAS_TERMIOS:
@@ -146,19 +183,19 @@ def read_quote_no_paste(expected_quote: str) -> bool:
         tty.setraw(fd)
 
         while True:
-            # Read one character
-            char = sys.stdin.read(1)
+            # Read everything pending in one syscall (raw mode: VMIN=1, VTIME=0)
+            chunk = os.read(fd, 4096).decode('utf-8', errors='ignore')
 
-            # Check if there's more input waiting (paste detection)
-            # Use select with 0 timeout to check if more data is available
-            if select.select([sys.stdin], [], [], 0.0)[0]:
-                # More characters waiting = paste detected
+            # A keystroke delivers one character; more than one = paste detected
+            if len(chunk) > 1:
                 print("\n\n✗ Paste detected! You must type the quote manually.")
                 print("Chrome Focus remains enabled.\n")
                 return False
 
+            char = chunk
+
             # Handle special characters
-            if char == '\x03':  # Ctrl+C
+            if not char or char == '\x03':  # EOF or Ctrl+C
                 print("\n\n✗ Cancelled.\n")
                 return False
 
@@ -197,7 +234,7 @@ def start_daemon() -> None:
     if lock_file.exists():
         with open(lock_file, 'r') as f:
             pid = int(f.read().strip())
-            if psutil.pid_exists(pid):
+            if pid_alive(pid):
                 print(f"✓ Daemon already running")
                 return
 
@@ -227,7 +264,7 @@ def stop_daemon() -> None:
     with open(lock_file, 'r') as f:
         pid = int(f.read().strip())
 
-    if psutil.pid_exists(pid):
+    if pid_alive(pid):
         os.kill(pid, signal.SIGTERM)
         print(f"✓ Daemon stopped")
 
@@ -240,10 +277,83 @@ def is_daemon_running() -> bool:
     if lock_file.exists():
         with open(lock_file, 'r') as f:
             pid = int(f.read().strip())
-            return psutil.pid_exists(pid)
+            return pid_alive(pid)
     return False
 
 
+def schedule_reenable(minutes: int) -> bool:
+    """Schedule `on` to run after N minutes without blocking the CLI.
+
+    Records the systemd unit or detached pid so cancel_reenable() can find
+    it. Returns False if the re-enable could not be scheduled.
+    """
+    script = str(Path(__file__).resolve())
+    lock_file = get_reenable_lock_file()
+
+    # Prefer a systemd one-shot timer; KillMode=process keeps the daemon
+    # started by `on` alive after the transient service exits
+    if shutil.which("systemd-run"):
+        unit = get_obfuscated_daemon_name()
+        result = subprocess.run(
+            ["systemd-run", "--quiet", f"--on-active={minutes}m",
+             f"--unit={unit}",
+             "--property=KillMode=process",
+             sys.executable, script, "on"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        if result.returncode == 0:
+            with open(lock_file, 'w') as f:
+                f.write(f"unit {unit}")
+            return True
+
+    # No systemd (e.g. macOS): detached sleep, then re-enable
+    try:
+        proc = subprocess.Popen(
+            ["/bin/sh", "-c", 'sleep "$1" && exec "$2" "$3" on',
+             "sh", str(minutes * 60), sys.executable, script],
+            start_new_session=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return False
+
+    with open(lock_file, 'w') as f:
+        f.write(f"pid {proc.pid}")
+    return True
+
+
+def cancel_reenable() -> None:
+    """Cancel a pending re-enable scheduled by an earlier `off --duration`"""
+    lock_file = get_reenable_lock_file()
+    if not lock_file.exists():
+        return
+
+    with open(lock_file, 'r') as f:
+        kind, _, value = f.read().strip().partition(" ")
+
+    if kind == "unit":
+        # Stopping the timer is enough; a running re-enable is left alone
+        subprocess.run(
+            ["systemctl", "stop", f"{value}.timer"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    elif kind == "pid" and value.isdigit():
+        pid = int(value)
+        # Skip when this process *is* the re-enable (sh exec'd into `on`);
+        # only signal a process still leading its own group, like our sh
+        if pid != os.getpid():
+            try:
+                if os.getpgid(pid) == pid:
+                    os.killpg(pid, signal.SIGTERM)  # sh and its sleep
+            except ProcessLookupError:
+                pass  # Already exited
+
+    lock_file.unlink()
+
+
 @click.group()
 def cli():
     """Chrome Focus - Enforce Chrome extensions to stay focused"""
@@ -254,6 +364,7 @@ def cli():
 def on():
     """Enable Chrome extension enforcement and start daemon"""
     print("🔒 Enabling Chrome Focus...")
+    cancel_reenable()
     create_chrome_policy()
     start_daemon()
     print("✓ Chrome Focus is now ON")
@@ -288,20 +399,20 @@ def off(duration: Optional[int]):
 
     print("\n✓ Quote verified. Disabling Chrome Focus...")
 
-    # Stop daemon and remove policy
+    # Stop daemon and remove policy; drop any re-enable from an earlier
+    # `off --duration` so it can't turn enforcement back on later
     stop_daemon()
     remove_chrome_policy()
+    cancel_reenable()
 
     if duration:
         print(f"\n✓ Chrome Focus disabled for {duration} minute(s)")
-        print(f"  It will automatically re-enable at {time.strftime('%H:%M:%S', time.localtime(time.time() + duration * 60))}")
-
-        # Schedule re-enable
-        time.sleep(duration * 60)
-        print("\n⏰ Time's up! Re-enabling Chrome Focus...")
-        create_chrome_policy()
-        start_daemon()
-        print("✓ Chrome Focus is back ON")
+
+        # Schedule re-enable in the background; the CLI returns immediately
+        if schedule_reenable(duration):
+            print(f"  It will automatically re-enable at {time.strftime('%H:%M:%S', time.localtime(time.time() + duration * 60))}")
+        else:
+            print("  ⚠️  Could not schedule automatic re-enable. Run 'sudo cf on' when done.")
     else:
         print("\n✓ Chrome Focus is now OFF")
 
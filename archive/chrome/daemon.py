@@ -2,13 +2,18 @@
 """
 Chrome Focus Daemon - Watches and auto-restores Chrome policy file
 """
+import os
 import sys
 import time
 import json
+import functools
+import signal
+import struct
+import tempfile
+import threading
+import ctypes
+import ctypes.util
 from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import yaml
 
 try:
     import setproctitle
@@ -16,28 +21,72 @@ try:
 except ImportError:
     HAS_SETPROCTITLE = False
 
+# Linux uses inotify directly; other platforms fall back to watchdog
+HAS_INOTIFY = sys.platform.startswith("linux")
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+# Cross-platform Chrome policy paths (resolved once at import)
+if sys.platform == "darwin":  # macOS
+    _POLICY_DIR = Path("/Library/Google/Chrome/NativeMessagingHosts/policies/managed")
+else:  # Linux
+    _POLICY_DIR = Path("/etc/opt/chrome/policies/managed")
+_POLICY_FILE = _POLICY_DIR / "managed_policies.json"
+
 
 def get_chrome_policy_path() -> Path:
     """Get Chrome managed policy path for current OS"""
-    if sys.platform == "darwin":  # macOS
-        return Path("/Library/Google/Chrome/NativeMess agingHosts/policies/managed")
-    else:  # Linux
-        return Path("/etc/opt/chrome/policies/managed")
+    return _POLICY_DIR
 
 
 def get_policy_file_path() -> Path:
     """Get full path to policy JSON file"""
-    return get_chrome_policy_path() / "managed_policies.json"
+    return _POLICY_FILE
 
 
+@functools.lru_cache(maxsize=1)
 def load_plugins() -> list:
-    """Load plugins from YAML file"""
+    """Load plugins from YAML file (parsed once per process)"""
+    import yaml
+
     yaml_path = Path(__file__).parent / "plugins.yml"
+    # Prefer the LibYAML C parser when PyYAML was built with it
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(yaml_path, 'r') as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=loader)
         return data.get('plugins', [])
 
 
+def _write_atomic(path: Path, blob: bytes) -> None:
+    """Write bytes to a temp file next to path and rename it into place, so
+    the swap is a single atomic rename on the same filesystem"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".sync.")
+    try:
+        try:
+            view = memoryview(blob)
+            while view:
+                view = view[os.write(fd, view):]  # Retry short writes
+            os.fchmod(fd, 0o644)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
 def create_chrome_policy() -> None:
     """Create Chrome managed policy JSON file"""
     plugins = load_plugins()
@@ -50,37 +99,123 @@ def create_chrome_policy() -> None:
     policy_path = get_policy_file_path()
     policy_path.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(policy_path, 'w') as f:
-        json.dump(policy, f, indent=2)
+    # Chrome ignores whitespace, so serialize compact bytes up front
+    blob = json.dumps(policy, separators=(",", ":")).encode()
+    _write_atomic(policy_path, blob)
 
 
-class ChromePolicyWatcher(FileSystemEventHandler):
-    """Watch Chrome policy directory and auto-restore deleted policy"""
+class ChromePolicyWatcher:
+    """Auto-restore the policy file when it is deleted or cleared"""
 
     def __init__(self, policy_file: Path):
         self.policy_file = policy_file
 
-    def on_deleted(self, event):
-        """Called when a file is deleted"""
-        if event.src_path == str(self.policy_file):
-            print(f"Policy file deleted, restoring...", file=sys.stderr)
-            time.sleep(0.5)  # Brief delay to avoid race conditions
-            create_chrome_policy()
-            print(f"Policy file restored", file=sys.stderr)
+    def on_deleted(self):
+        """Called when the policy file is deleted or moved away"""
+        print(f"Policy file deleted, restoring...", file=sys.stderr)
+        time.sleep(0.5)  # Brief delay to avoid race conditions
+        create_chrome_policy()
+        print(f"Policy file restored", file=sys.stderr)
 
-    def on_modified(self, event):
-        """Called when a file is modified"""
+    def on_written(self):
+        """Called when the policy file is written"""
         # Check if policy was cleared/tampered
-        if event.src_path == str(self.policy_file):
+        try:
+            with open(self.policy_file, 'r') as f:
+                content = f.read().strip()
+                if not content or content == "{}":
+                    print(f"Policy file cleared, restoring...", file=sys.stderr)
+                    create_chrome_policy()
+                    print(f"Policy file restored", file=sys.stderr)
+        except Exception:
+            pass
+
+
+def open_inotify(policy_dir: Path) -> int:
+    """Create an inotify fd watching the policy directory (Linux)"""
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fd = libc.inotify_init1(IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    # Only the events that can mean tampering; IN_CLOSE_WRITE fires once
+    # per save, unlike IN_MODIFY which fires on every partial write, and
+    # IN_MOVED_TO catches rename-over saves. The *_SELF events report the
+    # directory itself going away, which kills the watch.
+    mask = (IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_CLOSE_WRITE
+            | IN_DELETE_SELF | IN_MOVE_SELF)
+    if libc.inotify_add_watch(fd, os.fsencode(str(policy_dir)), mask) < 0:
+        err = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(err, f"inotify_add_watch failed for {policy_dir}")
+    return fd
+
+
+def watch_inotify(watcher: ChromePolicyWatcher, fd: int) -> None:
+    """Block on inotify events from open_inotify() and dispatch them"""
+    policy_dir = watcher.policy_file.parent
+    policy_name = watcher.policy_file.name
+    try:
+        while True:
+            buf = os.read(fd, 4096)  # Blocks until events arrive
+            offset = 0
+            while offset < len(buf):
+                _, event_mask, _, name_len = INOTIFY_EVENT.unpack_from(buf, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(buf[offset:offset + name_len].rstrip(b"\0"))
+                offset += name_len
+
+                # Directory deleted/moved (or watch dropped): recreate it,
+                # re-watch it, and drop the rest of the dead watch's events
+                if event_mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    os.close(fd)
+                    fd = -1
+                    if not watcher.policy_file.exists():
+                        watcher.on_deleted()
+                    fd = open_inotify(policy_dir)
+                    # Catch a removal that landed before the new watch
+                    if not watcher.policy_file.exists():
+                        watcher.on_deleted()
+                    break
+
+                if name != policy_name:
+                    continue
+                if event_mask & (IN_DELETE | IN_MOVED_FROM):
+                    watcher.on_deleted()
+                elif event_mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    watcher.on_written()
+    finally:
+        if fd >= 0:
+            os.close(fd)
+
+
+def watch_observer(watcher: ChromePolicyWatcher, on_failure):
+    """Start a watchdog observer on the policy directory (non-Linux fallback)"""
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+
+    policy_path = str(watcher.policy_file)
+
+    class Handler(FileSystemEventHandler):
+        def dispatch(self, event):
             try:
-                with open(self.policy_file, 'r') as f:
-                    content = f.read().strip()
-                    if not content or content == "{}":
-                        print(f"Policy file cleared, restoring...", file=sys.stderr)
-                        create_chrome_policy()
-                        print(f"Policy file restored", file=sys.stderr)
-            except Exception:
-                pass
+                super().dispatch(event)
+            except BaseException:
+                on_failure()  # Observer thread is about to die
+                raise
+
+        def on_deleted(self, event):
+            if event.src_path == policy_path:
+                watcher.on_deleted()
+
+        def on_modified(self, event):
+            if event.src_path == policy_path:
+                watcher.on_written()
+
+    observer = Observer()
+    observer.schedule(Handler(), str(watcher.policy_file.parent), recursive=False)
+    observer.start()
+    return observer
 
 
 def main():
@@ -96,19 +231,45 @@ def main():
     if not policy_file.exists():
         create_chrome_policy()
 
+    # Sleep until SIGTERM/SIGINT or a watcher failure, instead of waking up
+    # on a timer
+    stop = threading.Event()
+    failed = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    def on_failure():
+        failed.set()
+        stop.set()
+
     # Set up file watcher
-    event_handler = ChromePolicyWatcher(policy_file)
-    observer = Observer()
-    observer.schedule(event_handler, str(policy_file.parent), recursive=False)
-    observer.start()
+    watcher = ChromePolicyWatcher(policy_file)
+    observer = None
+    if HAS_INOTIFY:
+        # Set up the watch here so a failure kills the daemon instead of
+        # leaving it running with nothing watched
+        fd = open_inotify(policy_file.parent)
 
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
+        def run_watcher():
+            try:
+                watch_inotify(watcher, fd)
+            finally:
+                on_failure()  # watch_inotify only returns by raising
+
+        threading.Thread(target=run_watcher, daemon=True).start()
+    else:
+        observer = watch_observer(watcher, on_failure)
+
+    stop.wait()
+
+    if observer is not None:
         observer.stop()
+        observer.join()
 
-    observer.join()
+    # Nothing is being watched any more: exit non-zero so it is visible
+    if failed.is_set():
+        print("Policy watcher died, exiting", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":